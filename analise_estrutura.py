@@ -8,6 +8,12 @@ soltos, discrepâncias de metadados, macros inesperadas etc.).
 Uso CLI::
 
     python analise_estrutura.py <arquivo> [-o relat.json] [--verbose]
+                                [--max-bytes N] [--cache]
+
+Com ``--cache``, resultados ficam em cache (JSON em CACHE_DIR, privado do usuário,
+chaveado por conteúdo parcial + tamanho + mtime). É opcional porque a chave não
+cobre o meio do arquivo: uma edição de mesmo tamanho com o mtime original
+(preservado por zip/tar) devolveria os findings antigos.
 
 Dependências principais (além das já listadas no projeto):
     pikepdf>=9.3.0        # parsing de PDF
@@ -20,7 +26,10 @@ faltarem.
 from __future__ import annotations
 
 import argparse
+import hashlib
 import json
+import mmap
+import os
 import re
 import sys
 import zipfile
@@ -28,23 +37,102 @@ from dataclasses import asdict, dataclass, field
 from pathlib import Path
 from typing import List, Optional
 
+try:
+    from lxml import etree  # type: ignore
+except ImportError:  # pragma: no cover
+    etree = None
+
+# ---------------------- XPath pré-compilados (DOCX) -------
+
+_OOXML_NS = {
+    "cp": "http://schemas.openxmlformats.org/package/2006/metadata/core-properties",
+    "dc": "http://purl.org/dc/elements/1.1/",
+    "dcterms": "http://purl.org/dc/terms/",
+    "w": "http://schemas.openxmlformats.org/wordprocessingml/2006/main",
+}
+
+if etree is not None:
+    # parser único e endurecido (sem entidades/DTD externos → sem XXE),
+    # reaproveitado em todos os DOCX
+    _XML_PARSER = etree.XMLParser(resolve_entities=False, no_network=True,
+                                  collect_ids=False, huge_tree=False)
+    _CREATED_XP = etree.XPath("dcterms:created/text()", namespaces=_OOXML_NS)
+    _MODIFIED_XP = etree.XPath("dcterms:modified/text()", namespaces=_OOXML_NS)
+    _TRACK_XP = etree.XPath(".//w:trackRevisions", namespaces=_OOXML_NS)
+
+# ---------------------- parâmetros ------------------------
+
+MAX_PDF_BYTES = 256 * 1024 * 1024  # acima disso, só a varredura de bytes crus
+CACHE_DIR: Optional[Path] = None  # None: <cache do usuário>/fraude-documentos/estrutura
+_CACHE_VERSION = 2     # incrementar quando os findings mudarem de formato/semântica
+_CACHE_KEY_CHUNK = 64 * 1024
+
 # ---------------------- utils -----------------------------
 
 def _count_eof_markers(pdf_bytes: bytes) -> int:
-    """Conta quantas vezes a tag '%%EOF' aparece no binário;\n    >1 indica incremental updates possíveis."""
-    return len(re.findall(br"%%EOF", pdf_bytes))
+    """Conta quantas vezes a tag '%%EOF' aparece no binário;\n    >1 indica incremental updates possíveis.
+
+    Aceita ``bytes`` ou ``mmap`` (que não tem ``.count``): cada ``find``
+    roda em C e nenhuma lista de ocorrências é materializada.
+    """
+    count = 0
+    pos = pdf_bytes.find(b"%%EOF")
+    while pos != -1:
+        count += 1
+        pos = pdf_bytes.find(b"%%EOF", pos + 5)
+    return count
+
+
+# nome /JavaScript ou /JS seguido de delimitador/espaço (não /JSFoo)
+_JS_NAME_RE = re.compile(rb"/(?:JavaScript|JS)(?![^\x00\t\n\x0c\r ()<>\[\]{}/%])")
+
+
+# palavra-chave stream logo após o ">>" do dicionário e seguida de EOL;
+# "stream" solto (p.ex. dentro de /Title (mainstream)) não abre trecho binário
+_STREAM_RE = re.compile(rb">>\s*stream\r?\n")
+
+
+def _detect_javascript(pdf_bytes: bytes) -> bool:
+    """Procura nomes /JavaScript ou /JS (possível cargo de malware) no binário.
+
+    Varre só os trechos fora de ``stream``…``endstream``, evitando falsos
+    positivos em dados comprimidos; é uma única passada linear sobre o
+    buffer (``bytes`` ou ``mmap``). Só vale como triagem positiva: nomes
+    com escapes (``/Java#53cript``), strings com ``>>stream`` e object
+    streams escapam dela, então ``False`` não descarta JavaScript.
+    """
+    pos, end = 0, len(pdf_bytes)
+    while pos < end:
+        m = _STREAM_RE.search(pdf_bytes, pos)
+        stop = end if m is None else m.end()
+        if _JS_NAME_RE.search(pdf_bytes, pos, stop):
+            return True
+        if m is None:
+            return False
+        close = pdf_bytes.find(b"endstream", m.end())
+        if close == -1:  # stream sem fim: trata o resto como texto
+            return _JS_NAME_RE.search(pdf_bytes, m.end(), end) is not None
+        pos = close + 9
+    return False
+
 
+def _detect_javascript_objects(pdf) -> bool:  # type: ignore[valid-type]
+    """Procura /JavaScript ou /JS nos dicionários já resolvidos pelo pikepdf.
+
+    Confirma todo negativo da varredura de bytes crus: o pikepdf já decodifica
+    escapes de nomes e abre os object streams (/ObjStm). Cada objeto
+    indireto é serializado (``unparse``) para cobrir também os dicionários
+    diretos aninhados, como ``/OpenAction << /S /JavaScript ... >>``.
+    """
+    import pikepdf
 
-def _detect_javascript(pdf) -> bool:  # type: ignore[valid-type]
-    """Procura objetos /JavaScript ou /JS (possível cargo de malware)."""
     try:
-        for obj in pdf.trailer.root.iter_objects():  # pikepdf ige
-            if isinstance(obj, dict):
-                if "/JavaScript" in obj or b"/JavaScript" in obj:
-                    return True
-                if "/JS" in obj or b"/JS" in obj:
-                    return True
-    except Exception:  # pragma: no cover – melhor retornar False do que quebrar
+        for obj in pdf.objects:
+            if isinstance(obj, pikepdf.Stream):
+                obj = obj.stream_dict
+            if isinstance(obj, pikepdf.Dictionary) and _JS_NAME_RE.search(obj.unparse(resolved=True)):
+                return True
+    except Exception:  # pragma: no cover – melhor retornar False do que quebrar
         return False
     return False
 
@@ -81,42 +169,77 @@ class StructureReport:
 
 # ---------------------- PDF analysis ----------------------
 
-def _analyze_pdf(path: Path, verbose: bool = False) -> PDFStructureFindings:
+def _looks_like_pdf(pdf_bytes: bytes) -> bool:
+    """O cabeçalho %PDF- deve aparecer no primeiro KiB (a spec tolera lixo antes)."""
+    return pdf_bytes.find(b"%PDF-", 0, 1024) != -1
+
+
+def _analyze_pdf(path: Path, verbose: bool = False, max_bytes: int = MAX_PDF_BYTES) -> PDFStructureFindings:
     try:
         import pikepdf  # local import to allow fallback
     except ImportError:
         raise RuntimeError("pikepdf não instalado – instale para análise estrutural de PDFs")
 
-    pdf_bytes = path.read_bytes()
-    eof_markers = _count_eof_markers(pdf_bytes)
+    size = path.stat().st_size
+    not_pdf = PDFStructureFindings(
+        incremental_updates=False,
+        eof_markers=0,
+        creation_date=None,
+        mod_date=None,
+        mod_after_creation=None,
+        javascript_detected=False,
+        suspicious_objects=["Cabecalho_PDF_ausente"],
+    )
+    if size == 0:
+        return not_pdf
+
+    # mmap em vez de read_bytes(): o SO pagina só o que a busca toca e o
+    # arquivo não é copiado para a memória do processo antes do pikepdf.
+    with path.open("rb") as fh, mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        if not _looks_like_pdf(mm):
+            # .pdf renomeado/corrompido: rejeita antes de o pikepdf tentar parsear
+            if verbose:
+                print(f"[WARN] {path.name} não tem cabeçalho %PDF- – análise interrompida")
+            return not_pdf
+        eof_markers = _count_eof_markers(mm)
+        javascript = _detect_javascript(mm)
     incremental_updates = eof_markers > 1
 
     creation_date = None
     mod_date = None
     mod_after_creation: Optional[bool] = None
-    javascript = False
+    free_objs = None
     suspicious: List[str] = []
 
-    with pikepdf.open(path, allow_overwriting_input=True) as pdf:
-        info = pdf.docinfo  # tipo pikepdf.Dictionary
-        creation_date = str(info.get("/CreationDate")) if info else None
-        mod_date = str(info.get("/ModDate")) if info else None
-        if creation_date and mod_date:
-            # simples comparação lexicográfica serve na maioria;
-            # datas PDF são tipo D:YYYYMMDDhhmmss
-            mod_after_creation = mod_date > creation_date
-        javascript = _detect_javascript(pdf)
-        if javascript:
-            suspicious.append("JavaScript_embutido")
-
-        # Exemplo de objeto solto: stream sem referência no xref
-        # pikepdf mantém Set[int] pdf.trailer.xref_sections[0].obj_free
-        try:
-            free_objs = pdf.xref_free_objects  # type: ignore[attr-defined]
-            if free_objs:
-                suspicious.append(f"Objetos_free:{len(free_objs)}")
-        except Exception:
-            pass
+    if size > max_bytes:
+        # acima do teto fica só a varredura de bytes, sem parse completo
+        if verbose:
+            print(f"[WARN] {path.name} tem {size} bytes (> {max_bytes}) – análise estrutural parcial")
+    else:
+        with pikepdf.open(path, allow_overwriting_input=True) as pdf:
+            info = pdf.docinfo  # tipo pikepdf.Dictionary
+            creation_date = str(info.get("/CreationDate")) if info else None
+            mod_date = str(info.get("/ModDate")) if info else None
+            if creation_date and mod_date:
+                # simples comparação lexicográfica serve na maioria;
+                # datas PDF são tipo D:YYYYMMDDhhmmss
+                mod_after_creation = mod_date > creation_date
+            if not javascript:  # a varredura crua só confirma, nunca descarta
+                javascript = _detect_javascript_objects(pdf)
+
+            # Exemplo de objeto solto: stream sem referência no xref
+            # pikepdf mantém Set[int] pdf.trailer.xref_sections[0].obj_free
+            try:
+                free_objs = pdf.xref_free_objects  # type: ignore[attr-defined]
+            except Exception:
+                pass
+
+    if javascript:
+        suspicious.append("JavaScript_embutido")
+    if free_objs:
+        suspicious.append(f"Objetos_free:{len(free_objs)}")
+    if size > max_bytes:
+        suspicious.append(f"Analise_parcial:tamanho>{max_bytes}")
 
     return PDFStructureFindings(
         incremental_updates=incremental_updates,
@@ -132,9 +255,7 @@ def _analyze_pdf(path: Path, verbose: bool = False) -> PDFStructureFindings:
 # ---------------------- DOCX analysis ---------------------
 
 def _analyze_docx(path: Path, verbose: bool = False) -> DOCXStructureFindings:
-    try:
-        from lxml import etree
-    except ImportError:
+    if etree is None:
         raise RuntimeError("lxml não instalado – instale para análise estrutural de DOCX")
 
     with zipfile.ZipFile(path) as zf:
@@ -144,14 +265,11 @@ def _analyze_docx(path: Path, verbose: bool = False) -> DOCXStructureFindings:
         # Core properties (ISO 29500)
         try:
             core_xml = zf.read("docProps/core.xml")
-            core_root = etree.fromstring(core_xml)  # type: ignore
-            ns = {"cp": "http://schemas.openxmlformats.org/package/2006/metadata/core-properties",
-                  "dc": "http://purl.org/dc/elements/1.1/",
-                  "dcterms": "http://purl.org/dc/terms/"}
-            creation_el = core_root.find("dcterms:created", ns)
-            mod_el = core_root.find("dcterms:modified", ns)
-            creation_date = creation_el.text if creation_el is not None else None
-            mod_date = mod_el.text if mod_el is not None else None
+            core_root = etree.fromstring(core_xml, _XML_PARSER)  # type: ignore
+            created = _CREATED_XP(core_root)
+            modified = _MODIFIED_XP(core_root)
+            creation_date = str(created[0]) if created else None
+            mod_date = str(modified[0]) if modified else None
             mod_after_creation = None
             if creation_date and mod_date:
                 mod_after_creation = mod_date > creation_date
@@ -161,9 +279,8 @@ def _analyze_docx(path: Path, verbose: bool = False) -> DOCXStructureFindings:
         # Detectar TrackChanges no settings.xml
         try:
             settings_xml = zf.read("word/settings.xml")
-            settings_root = etree.fromstring(settings_xml)  # type: ignore
-            has_track_changes = settings_root.find(".//w:trackRevisions", namespaces={
-                "w": "http://schemas.openxmlformats.org/wordprocessingml/2006/main"}) is not None
+            settings_root = etree.fromstring(settings_xml, _XML_PARSER)  # type: ignore
+            has_track_changes = bool(_TRACK_XP(settings_root))
         except KeyError:
             has_track_changes = False
 
@@ -176,19 +293,88 @@ def _analyze_docx(path: Path, verbose: bool = False) -> DOCXStructureFindings:
     )
 
 
+# ---------------------- Cache -----------------------------
+
+def _cache_key(path: Path, *extra) -> str:
+    """Chave do cache: primeiros/últimos 64 KiB + tamanho + mtime (ns)."""
+    st = path.stat()
+    h = hashlib.sha1()
+    with path.open("rb") as f:
+        h.update(f.read(_CACHE_KEY_CHUNK))
+        if st.st_size > _CACHE_KEY_CHUNK:
+            f.seek(max(st.st_size - _CACHE_KEY_CHUNK, _CACHE_KEY_CHUNK))
+            h.update(f.read())
+    h.update(repr((st.st_size, st.st_mtime_ns, _CACHE_VERSION) + extra).encode())
+    return h.hexdigest()
+
+
+def _cache_dir() -> Optional[Path]:
+    """Diretório do cache, privado do usuário, ou None se não der para garantir.
+
+    Usa os helpers do pré‑processador, importado só aqui: ele puxa pikepdf,
+    pdf2image etc., que a análise estrutural sem cache não precisa.
+    """
+    try:
+        from document_preprocessor import _private_cache_dir, _user_cache_root  # type: ignore
+    except ImportError:  # sem ele, nada de cache
+        return None
+    cache_dir = CACHE_DIR or _user_cache_root() / "estrutura"
+    return cache_dir if _private_cache_dir(cache_dir) else None
+
+
+def _cached(findings_cls, path: Path, compute, *extra, verbose: bool = False):
+    """Devolve os findings do cache em disco ou calcula e grava (JSON)."""
+    cache_dir = _cache_dir()
+    if cache_dir is None:
+        return compute()
+    try:
+        entry = cache_dir / f"{_cache_key(path, findings_cls.__name__, *extra)}.json"
+    except OSError:
+        return compute()
+
+    try:
+        findings = findings_cls(**json.loads(entry.read_text(encoding="utf-8")))
+    except (OSError, ValueError, TypeError):  # ausente ou ilegível: recalcula
+        pass
+    else:
+        if verbose:
+            print(f"[INFO] Estrutura de {path.name} lida do cache")
+        return findings
+
+    findings = compute()
+    try:
+        tmp = entry.with_name(f"{entry.stem}.{os.getpid()}.tmp")
+        tmp.write_text(json.dumps(asdict(findings), ensure_ascii=False), encoding="utf-8")
+        tmp.replace(entry)  # atômico: leitores nunca veem JSON pela metade
+    except OSError:
+        pass
+    return findings
+
+
 # ---------------------- High-level API --------------------
 
-def analyze_structure(path: str | Path, verbose: bool = False) -> StructureReport:
-    """Detecta anomalias estruturais no documento indicado."""
+def analyze_structure(path: str | Path, verbose: bool = False,
+                      max_bytes: int = MAX_PDF_BYTES, cache: bool = False) -> StructureReport:
+    """Detecta anomalias estruturais no documento indicado.
+
+    PDFs maiores que `max_bytes` recebem só a varredura de bytes
+    (%%EOF, JavaScript), sem o parse completo pelo pikepdf. Com `cache`,
+    o resultado é reaproveitado de CACHE_DIR enquanto início, fim, tamanho
+    e mtime do arquivo não mudarem.
+    """
     p = Path(path)
     if not p.exists():
         raise FileNotFoundError(p)
 
     if p.suffix.lower() == ".pdf":
-        pdf_findings = _analyze_pdf(p, verbose)
+        compute = lambda: _analyze_pdf(p, verbose, max_bytes)  # noqa: E731
+        pdf_findings = (_cached(PDFStructureFindings, p, compute, max_bytes, verbose=verbose)
+                        if cache else compute())
         return StructureReport(path=str(p), file_type="PDF", pdf_findings=pdf_findings)
     elif p.suffix.lower() in {".docx", ".docm"}:
-        docx_findings = _analyze_docx(p, verbose)
+        compute = lambda: _analyze_docx(p, verbose)  # noqa: E731
+        docx_findings = (_cached(DOCXStructureFindings, p, compute, verbose=verbose)
+                         if cache else compute())
         return StructureReport(path=str(p), file_type="DOCX", docx_findings=docx_findings)
     else:
         return StructureReport(path=str(p), file_type="UNKNOWN")
@@ -201,10 +387,14 @@ def _cli():
     parser.add_argument("arquivo", help="Caminho do arquivo a analisar")
     parser.add_argument("-o", "--out", help="Salvar relatório JSON em arquivo")
     parser.add_argument("--verbose", "-v", action="store_true", help="Saída detalhada")
+    parser.add_argument("--max-bytes", type=int, default=MAX_PDF_BYTES,
+                        help="Tamanho máximo de PDF para análise completa (padrão: 256 MiB)")
+    parser.add_argument("--cache", action="store_true", help="Reaproveitar resultados do cache em disco")
     args = parser.parse_args()
 
     try:
-        report = analyze_structure(args.arquivo, verbose=args.verbose)
+        report = analyze_structure(args.arquivo, verbose=args.verbose, max_bytes=args.max_bytes,
+                                   cache=args.cache)
     except Exception as exc:
         print(f"[ERROR] Falha na análise: {exc}", file=sys.stderr)
         sys.exit(1)
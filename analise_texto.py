@@ -9,6 +9,10 @@ Detecta:
 Requer:
     pip install langdetect nltk textstat scikit-learn python-docx pdfplumber
 
+Opcional:
+    pip install pyahocorasick   # busca de termos suspeitos em passada única
+    pip install pypdfium2       # extração de texto nativa (já vem com pdfplumber)
+
 Uso CLI:
     python analise_texto.py <arquivo> --verbose [-o out.json]
 
@@ -20,36 +24,58 @@ from __future__ import annotations
 
 import argparse
 import json
-import re
-import sys
 from collections import Counter
 from dataclasses import asdict, dataclass, field
+from functools import cache, lru_cache
 from pathlib import Path
 from statistics import mean, stdev
 from typing import List, Dict
 
 # ============ dependências externas ============
+# langdetect, nltk e textstat são importados no primeiro uso (e os corpora do
+# NLTK verificados uma única vez): importar o módulo continua barato.
 try:
-    from langdetect import detect as lang_detect, DetectorFactory
-    import nltk
-    from nltk.tokenize import word_tokenize, sent_tokenize, PunktSentenceTokenizer
-    from nltk.corpus import stopwords
-    import textstat
-except ImportError as e:  # pragma: no cover
+    import ahocorasick  # type: ignore  # pyahocorasick – opcional
+except ImportError:  # pragma: no cover
+    ahocorasick = None
+
+
+def _missing_lib(e: ImportError) -> RuntimeError:
     missing = str(e).split("No module named ")[-1].strip("'\"")
-    print(f"[ERROR] Biblioteca ausente: {missing}. Instale conforme header.")
-    sys.exit(1)
+    return RuntimeError(f"Biblioteca ausente: {missing}. Instale conforme header.")
 
-# estilometria básica – nenhuma lib pesada além do textstat
 
-DetectorFactory.seed = 42  # reproducibilidade para langdetect
+@cache
+def _ensure_nltk():
+    """Importa o NLTK e baixa os corpora essenciais em runtime, se necessário."""
+    try:
+        import nltk
+    except ImportError as e:  # pragma: no cover
+        raise _missing_lib(e) from e
+    for res in ["punkt", "stopwords"]:
+        try:
+            nltk.data.find(f"tokenizers/{res}" if res == "punkt" else f"corpora/{res}")
+        except LookupError:  # pragma: no cover
+            nltk.download(res, quiet=True)
+    return nltk
+
+
+@cache
+def _stop_words_pt() -> frozenset:
+    _ensure_nltk()
+    from nltk.corpus import stopwords
 
-# baixar corpora essenciais do NLTK em runtime, se necessário
-for res in ["punkt", "stopwords"]:
+    return frozenset(stopwords.words("portuguese"))
+
+
+@cache
+def _langdetect():
     try:
-        nltk.data.find(f"tokenizers/{res}" if res == "punkt" else f"corpora/{res}")
-    except LookupError:  # pragma: no cover
-        nltk.download(res, quiet=True)
+        import langdetect
+    except ImportError as e:  # pragma: no cover
+        raise _missing_lib(e) from e
+    langdetect.DetectorFactory.seed = 42  # reproducibilidade para langdetect
+    return langdetect
 
 # ============ parâmetros configuráveis ============
 SUSPECT_TERMS = {
@@ -58,8 +84,8 @@ SUSPECT_TERMS = {
 }
 MIN_PAGE_CHARS = 300   # ignora páginas muito curtas para estatística
 STYLE_STD_Z = 1.2      # z‑score para marcar página fora do padrão de estilo
-
-stop_words_pt = set(stopwords.words("portuguese"))
+LANG_CONFIDENCE = 0.95 # acima disso, só uma amostra das páginas é verificada
+LANG_MAX_SAMPLES = 20  # páginas amostradas quando o idioma dominante é claro
 
 # ============ dataclasses de saída ============
 @dataclass
@@ -82,7 +108,8 @@ class TextReport:
 # ============ utilitários ============
 
 def _clean_text(text: str) -> str:
-    return re.sub(r"\s+", " ", text.strip())
+    # split()/join colapsa qualquer espaço Unicode como \s+, sem regex
+    return " ".join(text.split())
 
 
 def _split_pages(text: str) -> List[str]:
@@ -90,25 +117,43 @@ def _split_pages(text: str) -> List[str]:
     return text.split("\f")
 
 
+@cache
+def _punkt_fallback():
+    """Tokenizador Punkt neutro, criado uma única vez."""
+    from nltk.tokenize import PunktSentenceTokenizer
+
+    return PunktSentenceTokenizer()
+
+
 def _calc_stylometry(text: str) -> StylometryStats:
     """Calcula métricas simples de estilometria para um bloco de texto."""
+    _ensure_nltk()
+    from nltk.tokenize import sent_tokenize, word_tokenize
+
+    try:
+        import textstat  # estilometria básica – nenhuma lib pesada além dele
+    except ImportError as e:  # pragma: no cover
+        raise _missing_lib(e) from e
+
     # usar fallback neutro se punkt específico faltar
     try:
         sentences = sent_tokenize(text)
     except LookupError:  # caso punkt não exista
-        tokenizer = PunktSentenceTokenizer()
-        sentences = tokenizer.tokenize(text)
+        sentences = _punkt_fallback().tokenize(text)
 
     if not sentences:
         sentences = [text]
 
     words = word_tokenize(text, language="portuguese")
-    words_no_stop = [w for w in words if w.lower() not in stop_words_pt and w.isalpha()]
+    # isalpha primeiro descarta pontuação antes do lower(); métodos em locais
+    lower, isalpha, stop = str.lower, str.isalpha, _stop_words_pt()
+    words_no_stop = [w for w in words if isalpha(w) and lower(w) not in stop]
 
     if not words_no_stop:
         return StylometryStats(0, 0, 0, 0)
 
-    avg_sentence_len = mean(len(word_tokenize(s)) for s in sentences)
+    # tokens por sentença a partir da tokenização já feita do texto inteiro
+    avg_sentence_len = len(words) / len(sentences)
     avg_word_len = mean(len(w) for w in words_no_stop)
     lexical_diversity = len(set(words_no_stop)) / len(words_no_stop)
     readability_fk = textstat.flesch_kincaid_grade(text) if text else 0.0
@@ -116,20 +161,71 @@ def _calc_stylometry(text: str) -> StylometryStats:
     return StylometryStats(avg_sentence_len, avg_word_len, lexical_diversity, readability_fk)
 
 
+@lru_cache(maxsize=4)
+def _term_automaton(terms: frozenset):
+    """Constrói (uma vez por conjunto de termos) o autômato Aho‑Corasick."""
+    automaton = ahocorasick.Automaton()
+    for term in terms:
+        automaton.add_word(term, term)
+    automaton.make_automaton()
+    return automaton
+
+
+def _find_suspect_terms(lower_text: str) -> set:
+    """Retorna os SUSPECT_TERMS presentes em `lower_text` (já em minúsculas).
+
+    Com pyahocorasick, todos os termos saem de uma única passada pelo texto;
+    sem ele, cai para um teste de substring por termo.
+    """
+    if ahocorasick is None or not SUSPECT_TERMS:
+        return {t for t in SUSPECT_TERMS if t in lower_text}
+    return {term for _, term in _term_automaton(frozenset(SUSPECT_TERMS)).iter(lower_text)}
+
+
 def _detect_language_sample(text: str) -> str:
     sample = text[:1000] if len(text) > 1000 else text
+    return _detect_language_cached(sample)
+
+
+@lru_cache(maxsize=1024)
+def _detect_language_cached(sample: str) -> str:
+    """Memoiza por amostra: páginas de template repetido não são redetectadas."""
+    langdetect = _langdetect()
     try:
-        return lang_detect(sample)
+        return langdetect.detect(sample)
     except Exception:  # pragma: no cover
         return "unknown"
 
+
+def _detect_languages(raw_text: str, pages: List[str]) -> Counter:
+    """Idiomas presentes no documento, contados por página.
+
+    As páginas são sempre verificadas uma a uma (memoizadas), pois uma única
+    página em outro idioma é o sinal procurado. Uma chamada ao langdetect
+    sobre o início do texto só decide quantas: com o idioma dominante acima
+    de LANG_CONFIDENCE, uma amostra espaçada de ~LANG_MAX_SAMPLES páginas;
+    abaixo disso, todas.
+    """
+    langdetect = _langdetect()
+    try:
+        top = langdetect.detect_langs(raw_text[:20_000])[0]
+    except Exception:  # pragma: no cover – texto sem features
+        top = None
+
+    filled = [t for t in pages if t.strip()]
+    step = 1
+    if top is not None and top.prob > LANG_CONFIDENCE:
+        step = max(1, len(filled) // LANG_MAX_SAMPLES)
+    return Counter(_detect_language_sample(t) for t in filled[::step])
+
 # ============ extração de texto ============
 
 def extract_text(path: str, ocr_dict: Dict[int, str] | None = None) -> str:
     """Extrai texto de PDF ou DOCX.
     – Se `ocr_dict` fornecido (da camada visual), usa‑o.
     – Para DOCX, usa python‑docx.
-    – Para PDF textual, usa pdfplumber.
+    – Para PDF textual, usa o extrator nativo do PDFium (pypdfium2) ou,
+      na falta dele, pdfplumber.
     """
     p = Path(path)
 
@@ -145,6 +241,23 @@ def extract_text(path: str, ocr_dict: Dict[int, str] | None = None) -> str:
         return "\n".join(par.text for par in doc.paragraphs)
 
     if p.suffix.lower() == ".pdf":
+        try:
+            import pypdfium2 as pdfium
+        except ImportError:
+            pdfium = None
+        if pdfium is not None:
+            texts = []
+            doc = pdfium.PdfDocument(path)
+            try:
+                for page in doc:
+                    textpage = page.get_textpage()
+                    texts.append(textpage.get_text_range())
+                    textpage.close()
+                    page.close()
+            finally:
+                doc.close()
+            return "\f".join(texts)
+
         try:
             import pdfplumber
         except ImportError as e:
@@ -172,14 +285,17 @@ def analyze_text(path: str, *, ocr_dict: Dict[int, str] | None = None) -> TextRe
     pages = _split_pages(raw_text)
 
     # ---------- detecção de idioma ----------
-    langs_counter = Counter(_detect_language_sample(t) for t in pages if t.strip())
+    langs_counter = _detect_languages(raw_text, pages)
     report.languages = list(langs_counter)
     if len(langs_counter) > 1:
         report.errors.append("Vários idiomas detectados: " + ", ".join(langs_counter))
 
     # ---------- termos suspeitos ----------
-    lower_text = raw_text.lower()
-    report.suspicious_terms = sorted({t for t in SUSPECT_TERMS if t in lower_text})
+    # página a página: o pico é uma página em minúsculas, não o documento
+    found: set = set()
+    for page_txt in pages:
+        found |= _find_suspect_terms(page_txt.lower())
+    report.suspicious_terms = sorted(found)
 
     # ---------- estilometria por página ----------
     stylistic_values = []  # (idx, readability)
@@ -12,43 +12,41 @@ CLI:
 
 Dependências adicionais (além das do projeto):
     pdf2image>=1.17.0
+    pypdfium2>=4.30                                     # opcional; renderiza direto em ndarray (sem Poppler)
     opencv-python-headless>=4.11.0.86
     scikit-image>=0.25.2
     pytesseract>=0.3.13
+    tesserocr>=2.7                                      # opcional; OCR via API C, modelo carregado 1x
     git+https://github.com/ocrim1996/prnu-python.git   # opcional; se ausente, PRNU é ignorado
+    numba>=0.60                                         # opcional; acelera o self‑match ORB
+    cupy-cuda12x                                        # opcional; resíduo PRNU na GPU
 """
 from __future__ import annotations
 
 import argparse
+import importlib
 import json
+import os
 import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor
 from dataclasses import asdict, dataclass, field
+from functools import lru_cache
 from pathlib import Path
 from typing import List, Optional
 
-import numpy as np
-from tqdm import tqdm
-
 # ------------------------------ dependências opcionais ---------------------
-try:
-    import cv2  # type: ignore
-except ImportError:  # pragma: no cover
-    cv2 = None  # noqa: N816  (mantemos minúsculo p/ marcar ausência)
-
-try:
-    from pdf2image import convert_from_path  # type: ignore
-except ImportError:  # pragma: no cover
-    convert_from_path = None
-
-try:
-    import pytesseract  # type: ignore
-except ImportError:  # pragma: no cover
-    pytesseract = None
-
-try:
-    import prnu  # type: ignore  # from prnu-python fork
-except ImportError:  # pragma: no cover
-    prnu = None
+# OpenCV, Tesseract, PRNU, numba, CuPy e até o numpy são importados só quando
+# uma página é de fato analisada: importar o módulo (p.ex. pelo orquestrador
+# para um PDF textual) não paga centenas de ms nem ~100 MB de RSS.
+
+@lru_cache(maxsize=None)
+def _optional(module: str):
+    """Importa `module` no primeiro uso; None se não estiver instalado."""
+    try:
+        return importlib.import_module(module)
+    except ImportError:  # pragma: no cover
+        return None
 
 # ------------------------------ dataclasses --------------------------------
 @dataclass
@@ -59,48 +57,210 @@ class VisualReport:
     copy_move: bool
     copy_move_boxes: List[List[int]] = field(default_factory=list)  # [x1,y1,x2,y2]
     prnu_inconsistent: Optional[bool] = None
+    prnu_residual: Optional[str] = None  # wavelet (CPU) ou wiener_gpu
     ocr_ratio: Optional[float] = None
     errors: List[str] = field(default_factory=list)
 
 # ------------------------------ helpers ------------------------------------
 ORB_MAX_KP = 3000
+ORB_MAX_DIM = 1200     # maior lado (px) da imagem entregue ao ORB
 MATCH_DIST_THRESHOLD = 30
 MIN_CLUSTER = 10
 PRNU_CORR_THRESHOLD = 0.7
+CLUSTER_BIN_PX = 16    # quantização do deslocamento (dx, dy) entre pares
+MIN_SHIFT_PX = 20      # pares mais próximos que isso são o mesmo ponto em outra escala
+FLANN_INDEX_LSH = 6
+PRNU_GPU_BATCH = 4     # páginas por lote na FFT da GPU
+
+
+@lru_cache(maxsize=None)
+def _selfmatch_kernel():
+    """Compila (uma vez por processo; cache em disco) o kernel numba, ou None."""
+    numba = _optional("numba")
+    if numba is None:
+        return None
+    import numpy as np
+
+    @numba.njit(parallel=True, cache=True)
+    def _popcount_selfmatch(des, thr, table):  # pragma: no cover – compilado
+        """Vizinho mais próximo (≠ si mesmo) de cada descritor ORB, por Hamming.
+
+        ``des`` é ``(N, 32) uint8``; devolve ``nearest[i]`` com o índice do
+        descritor mais próximo a distância < ``thr`` ou -1.
+        """
+        n, width = des.shape
+        nearest = np.full(n, -1, np.int32)
+        for i in numba.prange(n):
+            best = thr
+            for j in range(n):
+                if j == i:
+                    continue
+                d = 0
+                for k in range(width):
+                    d += table[des[i, k] ^ des[j, k]]
+                    if d >= best:
+                        break
+                if d < best:
+                    best = d
+                    nearest[i] = j
+        return nearest
+
+    return _popcount_selfmatch
 
 
 def _render_pdf(path: Path, poppler_path: Optional[str]):
-    if convert_from_path is None:
+    """Renderiza as páginas a 300 dpi.
+
+    Com pypdfium2, cada página vira direto um ``ndarray`` RGB (sem PNG
+    intermediário nem objeto PIL); senão, Poppler via pdf2image.
+    """
+    pdfium = _optional("pypdfium2")
+    if pdfium is not None:
+        pages = []
+        doc = pdfium.PdfDocument(str(path))
+        try:
+            for page in doc:
+                # buffer alocado pelo ctypes: o array mantém a memória viva
+                pages.append(page.render(scale=300 / 72, rev_byteorder=True).to_numpy())
+                page.close()
+        finally:
+            doc.close()
+        return pages
+
+    pdf2image = _optional("pdf2image")
+    if pdf2image is None:
         raise RuntimeError("pdf2image não está instalado; instale para renderizar PDFs.")
-    return convert_from_path(path, dpi=300, fmt="png", poppler_path=poppler_path)
+    return pdf2image.convert_from_path(path, dpi=300, fmt="png", poppler_path=poppler_path)
+
+
+def _self_match(des):
+    """Pares ``(i, j)`` de keypoints com descritores ORB quase idênticos."""
+    import numpy as np
+
+    kernel = _selfmatch_kernel()
+    if kernel is not None:
+        popcount8 = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+        nearest = kernel(np.ascontiguousarray(des, dtype=np.uint8), MATCH_DIST_THRESHOLD, popcount8)
+        query = np.flatnonzero(nearest >= 0)
+        pairs = np.column_stack((query, nearest[query]))
+    else:
+        # índice LSH para descritores binários: só vizinhos próximos, sem o
+        # O(N²) do BFMatcher; k=3 porque o 1º vizinho costuma ser o próprio ponto
+        cv2 = _optional("cv2")
+        index_params = dict(algorithm=FLANN_INDEX_LSH, table_number=12, key_size=20, multi_probe_level=2)
+        flann = cv2.FlannBasedMatcher(index_params, dict(checks=50))
+        pairs = np.array([(m.queryIdx, m.trainIdx)
+                          for knn in flann.knnMatch(des, des, k=3)
+                          for m in knn
+                          if m.queryIdx != m.trainIdx and m.distance < MATCH_DIST_THRESHOLD],
+                         dtype=np.int64).reshape(-1, 2)
+    # i→j e j→i são o mesmo par
+    return np.unique(np.sort(pairs, axis=1), axis=0) if len(pairs) else pairs
+
+
+def _cluster_displacements(pts, pairs):
+    """Agrupa os pares pelo deslocamento (dx, dy) quantizado.
+
+    Uma região clonada gera muitos pares com o mesmo deslocamento; devolve
+    os pontos ``(origem, destino)`` do maior grupo.
+    """
+    import numpy as np
+
+    src, dst = pts[pairs[:, 0]], pts[pairs[:, 1]]
+    # orienta cada par para que (dx, dy) e (-dx, -dy) caiam no mesmo bin
+    flip = ((dst[:, 0] < src[:, 0]) | ((dst[:, 0] == src[:, 0]) & (dst[:, 1] < src[:, 1])))[:, None]
+    src, dst = np.where(flip, dst, src), np.where(flip, src, dst)
+    shift = dst - src
+    keep = np.hypot(shift[:, 0], shift[:, 1]) >= MIN_SHIFT_PX
+    src, dst, shift = src[keep], dst[keep], shift[keep]
+    if not len(shift):
+        return src, dst
+    bins = np.floor(shift / CLUSTER_BIN_PX).astype(np.int64)
+    _, inverse, counts = np.unique(bins, axis=0, return_inverse=True, return_counts=True)
+    members = np.flatnonzero(inverse.ravel() == counts.argmax())
+    return src[members], dst[members]
+
+
+def _orb_detect(orb, img):
+    """detectAndCompute via T‑API (OpenCL) quando há dispositivo; senão CPU.
+
+    A página é reduzida para no máximo ``ORB_MAX_DIM`` px no maior lado;
+    devolve também o fator ``s`` aplicado (1.0 se não houve redução).
+    """
+    cv2 = _optional("cv2")
+    h, w = img.shape[:2]
+    s = min(1.0, ORB_MAX_DIM / max(h, w))
+    size = (int(w * s), int(h * s))
+
+    def _gray(src):
+        gray = cv2.cvtColor(src, cv2.COLOR_BGR2GRAY)
+        return cv2.resize(gray, size, interpolation=cv2.INTER_AREA) if s < 1 else gray
+
+    if cv2.ocl.haveOpenCL():
+        try:
+            kp, des = orb.detectAndCompute(_gray(cv2.UMat(img)), None)
+            return kp, (des.get() if isinstance(des, cv2.UMat) else des), s
+        except cv2.error:
+            pass
+    kp, des = orb.detectAndCompute(_gray(img), None)
+    return kp, des, s
 
 
 def _detect_copy_move(img):
+    cv2 = _optional("cv2")
     if cv2 is None:
         return False, []
-    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-    orb = cv2.ORB_create(nfeatures=ORB_MAX_KP)
-    kp, des = orb.detectAndCompute(gray, None)
+    import numpy as np
+
+    orb = cv2.ORB_create(nfeatures=ORB_MAX_KP, fastThreshold=20, edgeThreshold=31)
+    kp, des, s = _orb_detect(orb, img)
     if des is None or len(kp) < 2:
         return False, []
-    bf = cv2.BFMatcher(cv2.NORM_HAMMING, crossCheck=True)
-    matches = bf.match(des, des)
-    matches = [m for m in matches if m.distance < MATCH_DIST_THRESHOLD and m.queryIdx != m.trainIdx]
-    if len(matches) < MIN_CLUSTER:
+    pairs = _self_match(des)
+    if len(pairs) < MIN_CLUSTER:
+        return False, []
+    # agrupar por deslocamento aproximado, já em coordenadas da página original
+    pts = np.array([k.pt for k in kp], dtype=np.float32) / s
+    src, dst = _cluster_displacements(pts, pairs)
+    if len(src) < MIN_CLUSTER:
         return False, []
-    # agrupar por deslocamento aproximado
     boxes = []
-    for m in matches[:MIN_CLUSTER]:
-        pt1 = kp[m.queryIdx].pt
-        pt2 = kp[m.trainIdx].pt
+    for pt1, pt2 in zip(src[:MIN_CLUSTER], dst[:MIN_CLUSTER]):
         boxes.append([int(pt1[0]), int(pt1[1]), int(pt2[0]), int(pt2[1])])
     return True, boxes
 
 
 def _extract_prnu(residuals):
+    """True se alguma página (da 4ª em diante) destoa do ruído das 3 primeiras.
+
+    Correlação normalizada (mesma do ``prnu.corr2d``) calculada de uma vez
+    para todas as páginas: resíduos empilhados em ``(P, H, W)`` e um único
+    produto matriz‑vetor contra a referência.
+    """
+    import numpy as np
+
+    if len(residuals) <= 3:
+        return False
+    if len({r.shape for r in residuals}) > 1:  # páginas de tamanhos distintos
+        return _extract_prnu_pairwise(residuals)
+
+    stack = np.stack(residuals).astype(np.float32, copy=False)
+    stack -= stack.mean(axis=(1, 2), keepdims=True)
+    # usa a média do ruído das primeiras páginas como referência
+    ref = stack[:3].mean(axis=0).ravel()
+    flat = stack[3:].reshape(len(stack) - 3, -1)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        corrs = (flat @ ref) / (np.linalg.norm(flat, axis=1) * np.linalg.norm(ref))
+    return bool((corrs < PRNU_CORR_THRESHOLD).any())
+
+
+def _extract_prnu_pairwise(residuals):
+    """Caminho original, página a página via ``prnu.corr2d``."""
+    prnu = _optional("prnu")
     if prnu is None:
         return None
-    # usa a média do ruído das primeiras páginas como referência
+    import numpy as np
+
     ref = np.mean(residuals[:3], axis=0)
     inconsist = False
     for res in residuals[3:]:
@@ -111,16 +271,154 @@ def _extract_prnu(residuals):
     return inconsist
 
 
+def _gpu_available() -> bool:
+    cp = _optional("cupy")
+    if cp is None:
+        return False
+    try:
+        return bool(cp.cuda.is_available())
+    except Exception:  # pragma: no cover – driver/runtime ausente
+        return False
+
+
+def _to_gray(pg):
+    """Página (Path, PIL.Image ou ndarray RGB) em escala de cinza float32."""
+    import numpy as np
+    from PIL import Image
+
+    if isinstance(pg, Path):
+        img = Image.open(pg)
+    elif isinstance(pg, np.ndarray):
+        img = Image.fromarray(pg)
+    else:
+        img = pg
+    return np.asarray(img.convert("L"), dtype=np.float32)
+
+
+def _residual_cpu(pg):
+    """Resíduo PRNU por wavelet (``prnu.extract_single``) de uma página RGB."""
+    import numpy as np
+    from PIL import Image
+
+    img = Image.open(pg) if isinstance(pg, Path) else pg
+    return _optional("prnu").extract_single(np.asarray(img))
+
+
+def _extract_residuals_gpu(gray_pages):
+    """Resíduo de ruído (PRNU) via filtro de Wiener no domínio da FFT, na GPU.
+
+    Alternativa ao ``prnu.extract_single`` (wavelet, CPU): páginas de mesmo
+    tamanho são empilhadas em lotes ``(P, H, W)`` e filtradas numa única
+    ``rfftn``. A potência de ruído é estimada pela mediana do espectro.
+    """
+    import cupy as cp
+    import numpy as np
+
+    residuals = [None] * len(gray_pages)
+    by_shape = {}
+    for idx, g in enumerate(gray_pages):
+        by_shape.setdefault(g.shape, []).append(idx)
+
+    for shape, idxs in by_shape.items():
+        for start in range(0, len(idxs), PRNU_GPU_BATCH):
+            chunk = idxs[start:start + PRNU_GPU_BATCH]
+            x = cp.asarray(np.stack([gray_pages[i] for i in chunk]))
+            spec = cp.fft.rfftn(x, axes=(-2, -1))
+            power = cp.abs(spec) ** 2
+            noise = cp.median(power, axis=(-2, -1), keepdims=True)
+            keep = cp.maximum(power - noise, 0) / cp.maximum(power, 1e-12)  # ganho de Wiener
+            res = cp.fft.irfftn(spec * (1 - keep), s=shape, axes=(-2, -1))
+            # remove componentes lineares (linhas/colunas), como o zero_mean do prnu
+            res -= res.mean(axis=-1, keepdims=True)
+            res -= res.mean(axis=-2, keepdims=True)
+            for i, r in zip(chunk, cp.asnumpy(res.astype(cp.float32))):
+                residuals[i] = r
+    return residuals
+
+
+_tess_local = threading.local()
+
+
+def _tess_api():
+    """PyTessBaseAPI por thread (ou None): o traineddata por+eng carrega uma vez
+    e é reaproveitado em todas as páginas que o processo/thread analisar."""
+    api = getattr(_tess_local, "api", None)
+    if api is None:
+        tesserocr = _optional("tesserocr")
+        try:
+            api = tesserocr.PyTessBaseAPI(lang="por+eng", psm=tesserocr.PSM.AUTO)
+        except RuntimeError:  # pragma: no cover – traineddata ausente
+            api = False
+        _tess_local.api = api
+    return api or None
+
+
 def _ocr_text(pil_img):
-    if pytesseract is None:
+    import numpy as np
+
+    if isinstance(pil_img, np.ndarray):  # página do PDFium: PIL só para o Tesseract
+        from PIL import Image
+
+        pil_img = Image.fromarray(pil_img)
+    pytesseract = _optional("pytesseract")
+    api = _tess_api() if _optional("tesserocr") is not None else None
+    if api is not None:
+        if isinstance(pil_img, Path):
+            api.SetImageFile(str(pil_img))
+        else:
+            api.SetImage(pil_img)
+        txt = api.GetUTF8Text()
+    elif pytesseract is not None:
+        txt = pytesseract.image_to_string(pil_img, lang="por+eng")
+    else:
         return 0.0
-    txt = pytesseract.image_to_string(pil_img, lang="por+eng")
     words = txt.split()
     return len(words) / 100  # número arbitrário p/ ratio
 
+
+def _init_worker():
+    """Um thread numba por worker: os processos já ocupam todas as CPUs."""
+    numba = _optional("numba")
+    if numba is not None:
+        numba.set_num_threads(1)
+
+
+def _analyze_page(item):
+    """Analisa uma página isolada: copy‑move, resíduo PRNU e OCR.
+
+    Recebe ``(idx, página, calcular_residuo)`` e devolve
+    ``(cm_flag, boxes, residual, ocr_words)``. Fica no nível do módulo para
+    poder ser despachada a outro processo.
+    """
+    idx, pg, want_residual = item
+    cv2 = _optional("cv2")
+    import numpy as np
+
+    if isinstance(pg, Path):
+        img = cv2.imread(str(pg)) if cv2 else None
+        pil_img = pg  # para OCR fallback (string path)
+    elif isinstance(pg, np.ndarray):  # RGB renderizado pelo PDFium
+        pil_img = pg
+        img = cv2.cvtColor(pg, cv2.COLOR_RGB2BGR) if cv2 else None
+    else:  # PIL.Image
+        pil_img = pg
+        img = cv2.cvtColor(np.array(pg), cv2.COLOR_RGB2BGR) if cv2 else None
+
+    # copy‑move
+    cm_flag, boxes = False, []
+    if img is not None and cv2 is not None:
+        cm_flag, boxes = _detect_copy_move(img)
+
+    # PRNU residual
+    residual = _residual_cpu(pil_img) if want_residual else None
+
+    # OCR
+    return cm_flag, [[idx] + b for b in boxes], residual, _ocr_text(pil_img)
+
 # ------------------------------ main analyzer ------------------------------
 
-def analyze(path: str, poppler_path: Optional[str] = None, verbose: bool = False) -> VisualReport:
+def analyze(path: str, poppler_path: Optional[str] = None, verbose: bool = False,
+            max_workers: Optional[int] = None) -> VisualReport:
     p = Path(path)
     errors: List[str] = []
 
@@ -141,31 +439,46 @@ def analyze(path: str, poppler_path: Optional[str] = None, verbose: bool = False
     residuals = []
     ocr_words = 0.0
 
-    for idx, pg in enumerate(tqdm(pages, disable=not verbose, desc="Analisando páginas")):
-        if isinstance(pg, Path):
-            img = cv2.imread(str(pg)) if cv2 else None
-            pil_img = pg  # para OCR fallback (string path)
-        else:  # PIL.Image
-            pil_img = pg
-            img = cv2.cvtColor(np.array(pg), cv2.COLOR_RGB2BGR) if cv2 else None
-
-        # copy‑move
-        if img is not None and cv2 is not None:
-            cm_flag, boxes = _detect_copy_move(img)
-            if cm_flag:
-                copy_move = True
-                copy_boxes.extend([[idx] + b for b in boxes])
-
-        # PRNU residuals
-        if prnu is not None:
-            residual = prnu.extract_single(np.array(pil_img))
+    # páginas são independentes e o trabalho pesado (OpenCV/Tesseract) é
+    # nativo: um processo por CPU dá ganho quase linear em PDFs longos
+    from tqdm import tqdm
+
+    # com GPU o resíduo PRNU sai em lote depois; nos workers só na CPU
+    prnu = _optional("prnu")
+    prnu_gpu = prnu is not None and _gpu_available()
+    workers = min(max_workers or os.cpu_count() or 1, len(pages))
+    items = [(idx, pg, prnu is not None and not prnu_gpu) for idx, pg in enumerate(pages)]
+    progress = dict(total=len(pages), disable=not verbose, desc="Analisando páginas")
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as ex:
+            results = list(tqdm(ex.map(_analyze_page, items), **progress))
+    else:
+        results = [_analyze_page(item) for item in tqdm(items, **progress)]
+
+    for cm_flag, boxes, residual, words in results:
+        if cm_flag:
+            copy_move = True
+            copy_boxes.extend(boxes)
+        if residual is not None:
             residuals.append(residual)
+        ocr_words += words
 
-        # OCR
-        ocr_words += _ocr_text(pil_img)
+    prnu_method = "wavelet" if prnu is not None else None
+    if prnu_gpu:
+        try:
+            residuals = _extract_residuals_gpu([_to_gray(pg) for pg in pages])
+            prnu_method = "wiener_gpu"
+        except Exception as e:  # pragma: no cover
+            # sem a GPU, o resíduo sai do wavelet na CPU, como sem CuPy
+            errors.append(f"PRNU GPU erro: {e}; usando wavelet na CPU")
+            if workers > 1:
+                with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as ex:
+                    residuals = list(ex.map(_residual_cpu, pages))
+            else:
+                residuals = [_residual_cpu(pg) for pg in pages]
 
     prnu_flag: Optional[bool] = None
-    if residuals and prnu is not None:
+    if residuals:
         try:
             prnu_flag = _extract_prnu(residuals)
         except Exception as e:  # pragma: no cover
@@ -178,6 +491,7 @@ def analyze(path: str, poppler_path: Optional[str] = None, verbose: bool = False
         copy_move=copy_move,
         copy_move_boxes=copy_boxes,
         prnu_inconsistent=prnu_flag,
+        prnu_residual=prnu_method if residuals else None,
         ocr_ratio=ocr_words / max(len(pages), 1),
         errors=errors,
     )
@@ -190,11 +504,13 @@ def _cli():
     ap.add_argument("arquivo")
     ap.add_argument("-o", "--out", help="salvar JSON neste caminho")
     ap.add_argument("--poppler-path", help="diretório dos binários do Poppler")
+    ap.add_argument("--workers", type=int, help="processos paralelos (padrão: nº de CPUs)")
     ap.add_argument("--verbose", action="store_true")
     args = ap.parse_args()
 
     try:
-        rep = analyze(args.arquivo, poppler_path=args.poppler_path, verbose=args.verbose)
+        rep = analyze(args.arquivo, poppler_path=args.poppler_path, verbose=args.verbose,
+                      max_workers=args.workers)
         rep_json = json.dumps(asdict(rep), ensure_ascii=False, indent=2)
         if args.out:
             Path(args.out).write_text(rep_json, encoding="utf-8")
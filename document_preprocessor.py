@@ -3,25 +3,27 @@
 Pré‑processador de documentos (PDF ou DOCX) para pipeline forense
 -----------------------------------------------------------------
 
-* Calcula hashes (SHA‑256/512) para cadeia de custódia.
+* Calcula hashes para cadeia de custódia: SHA‑256 + BLAKE3 (ou SHA‑512,
+  conforme `HASH_ALGO`).
 * Determina o tipo de documento.
 * Para PDF:
     - Extrai metadados via pikepdf.
-    - Conta páginas & verifica se contém texto via pdfplumber.
+    - Conta páginas & verifica se contém texto (operadores Tj/TJ) via pikepdf.
     - Se raster (scan) e `out_dir` definido, renderiza cada página
-      em PNG (300 dpi) usando pdf2image.
+      em JPEG (qualidade 85) ou PNG, a 300 dpi, usando pdf2image.
 * Para DOCX:
     - Extrai propriedades básicas via python‑docx.
 * Retorna um `PreprocessInfo` (dataclass) serializável em JSON.
 
 Uso CLI
 ~~~~~~~
-    python document_preprocessor.py arquivo.pdf --out tmp_img
+    python document_preprocessor.py arquivo.pdf --out tmp_img [--fmt jpeg|png]
 
 Dependências
 ~~~~~~~~~~~~
-    pikepdf, pdfplumber, pdf2image, python-docx, pillow, tqdm
+    pikepdf, pdf2image, python-docx, pillow
     (todas já listadas no requirements.txt)
+    blake3 (opcional; sem ele o segundo digest é o SHA‑512)
 
 Nota: Poppler e QPDF devem estar instalados no sistema.
 """
@@ -30,13 +32,79 @@ from __future__ import annotations
 import hashlib
 import json
 import mimetypes
+import mmap
 import os
+import re
 import sys
-from dataclasses import asdict, dataclass, field
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass, field, is_dataclass
 from pathlib import Path
 from typing import Any, Dict, List, Optional
 
-# libs opcionais (import late to allow graceful degradation)
+# libs opcionais (None se ausentes, para degradar graciosamente)
+try:
+    import orjson  # type: ignore
+except ImportError:
+    orjson = None  # type: ignore
+
+try:
+    import pikepdf as _pikepdf  # type: ignore
+except ImportError:
+    _pikepdf = None  # type: ignore
+
+try:
+    import pdf2image as _pdf2image  # type: ignore
+except ImportError:
+    _pdf2image = None  # type: ignore
+
+try:
+    import docx as _docx  # python-docx, type: ignore
+except ImportError:
+    _docx = None  # type: ignore
+
+try:
+    import blake3 as _blake3  # type: ignore
+except ImportError:
+    _blake3 = None  # type: ignore
+
+# Segundo digest de custódia, além do SHA‑256: "blake3" (SIMD + multithread)
+# ou "sha512", que assume quando o pacote blake3 não está instalado.
+HASH_ALGO = "blake3" if _blake3 is not None else "sha512"
+
+
+def _user_cache_root() -> Path:
+    """Raiz dos caches do projeto no diretório de cache do próprio usuário.
+
+    Nunca o /tmp compartilhado: lá qualquer usuário local poderia semear
+    entradas "limpas" para um arquivo cujo hash conhece.
+    """
+    base = os.environ.get("XDG_CACHE_HOME") or os.environ.get("LOCALAPPDATA")
+    return (Path(base) if base else Path.home() / ".cache") / "fraude-documentos"
+
+
+def _private_cache_dir(cache_dir: Path) -> bool:
+    """Cria `cache_dir` (e a raiz) com modo 0700; False se não for privado.
+
+    Diretório de outro dono ou com permissão para grupo/outros não é
+    usado: o cache é confiado sem verificação, então só o usuário escreve nele.
+    """
+    try:
+        for d in (cache_dir.parent, cache_dir):
+            d.mkdir(mode=0o700, parents=True, exist_ok=True)
+            if os.name == "posix":
+                st = d.stat()
+                if st.st_uid != os.getuid() or st.st_mode & 0o077:
+                    return False
+    except OSError:
+        return False
+    return True
+
+
+# Cache de resultados (sem renderização) chaveado pelo SHA-256 do conteúdo:
+# renomear/copiar o arquivo continua acertando o cache.
+CACHE_DIR = _user_cache_root() / "preprocess"
+_CACHE_VERSION = 3     # incrementar quando PreprocessInfo mudar de formato/semântica
 
 
 @dataclass
@@ -44,29 +112,71 @@ class PreprocessInfo:
     path: str
     file_type: str  # "PDF" | "DOCX" | "UNKNOWN"
     sha256: str
-    sha512: str
+    sha512: str | None
+    blake3: str | None = None
     pages: int | None = None
     is_pdf_text: bool | None = None
     metadata: Dict[str, Any] = field(default_factory=dict)
     rendered_images: List[str] = field(default_factory=list)
 
     def to_json(self) -> str:
-        return json.dumps(asdict(self), ensure_ascii=False, indent=2)
+        return _json_dumps(self)
 
 
 # ---------------------------------------------------------------------------
 # Utility helpers
 # ---------------------------------------------------------------------------
-
-def _hash_file(path: Path) -> tuple[str, str]:
-    """Return (sha256, sha512) of the file."""
-    h256 = hashlib.sha256()
-    h512 = hashlib.sha512()
-    with path.open("rb") as f:
-        for chunk in iter(lambda: f.read(8192), b""):
-            h256.update(chunk)
-            h512.update(chunk)
-    return h256.hexdigest(), h512.hexdigest()
+def _json_dumps(obj: Any) -> str:
+    """JSON indentado em UTF‑8; com orjson, dataclasses dispensam o asdict()."""
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS).decode()
+    if is_dataclass(obj):
+        obj = asdict(obj)
+    return json.dumps(obj, ensure_ascii=False, indent=2)
+
+
+def _new_hash(algo: str):
+    if algo == "blake3":
+        return _blake3.blake3(max_threads=_blake3.blake3.AUTO)
+    return hashlib.new(algo)
+
+
+def _digest_algos() -> list[str]:
+    """SHA-256 plus the second digest selected by ``HASH_ALGO`` (SHA-512 without blake3)."""
+    if HASH_ALGO == "blake3" and _blake3 is None:
+        return ["sha256", "sha512"]
+    return ["sha256", HASH_ALGO]
+
+
+def _file_digest(path: Path, algo: str) -> str:
+    """Hex digest of the file via ``hashlib.file_digest`` (C readinto loop) on 3.11+."""
+    with path.open("rb", buffering=0) as f:
+        if hasattr(hashlib, "file_digest"):
+            return hashlib.file_digest(f, lambda: _new_hash(algo)).hexdigest()
+        h = _new_hash(algo)  # Python 3.10
+        for chunk in iter(lambda: f.read(1 << 20), b""):  # 1 MiB
+            h.update(chunk)
+        return h.hexdigest()
+
+
+def _hash_file(path: Path) -> tuple[str, str | None, str | None]:
+    """Return (sha256, sha512, blake3) of the file; unselected digests are None.
+
+    The file is mapped once and the digests run in parallel threads over
+    the same memoryview (hashlib and blake3 release the GIL on large buffers).
+    """
+    algos = _digest_algos()
+    try:
+        with path.open("rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            hashes = {algo: _new_hash(algo) for algo in algos}
+            # a view é liberada antes do close do mmap (senão BufferError)
+            with memoryview(mm) as mv, ThreadPoolExecutor(max_workers=len(hashes)) as pool:
+                for fut in [pool.submit(h.update, mv) for h in hashes.values()]:
+                    fut.result()
+            digests = {algo: h.hexdigest() for algo, h in hashes.items()}
+    except (OSError, ValueError):  # arquivo vazio ou mmap indisponível
+        digests = {algo: _file_digest(path, algo) for algo in algos}
+    return digests["sha256"], digests.get("sha512"), digests.get("blake3")
 
 
 def _detect_mime(path: Path) -> str | None:
@@ -79,64 +189,148 @@ def _detect_mime(path: Path) -> str | None:
 # ---------------------------------------------------------------------------
 
 
-def _preprocess_pdf(path: Path, out_dir: Optional[Path] = None, verbose=False) -> dict:
-    info: dict[str, Any] = {}
+_TEXT_OPS = frozenset({"Tj", "TJ", "'", '"'})
+# operador de texto logo após seu operando string/array: "(..) Tj", "<..>Tj", "[..] TJ", "(..) '"
+_TEXT_OP_RE = re.compile(rb"""[)>\]]\s*(?:Tj|TJ|'|")(?![^\s()<>\[\]{}/%])""")
+_DO_OP_RE = re.compile(rb"\sDo(?![^\s()<>\[\]{}/%])")
+# imagem inline (BI … ID <binário> EI): os bytes crus casam com qualquer regex
+_BI_OP_RE = re.compile(rb"(?:^|\s)BI(?![^\s()<>\[\]{}/%])")
 
-    # Basic stats via pdfplumber
-    try:
-        import pdfplumber  # type: ignore
-
-        with pdfplumber.open(str(path)) as pdf:
-            num_pages = len(pdf.pages)
-            # A heurística: se a primeira página tem char objects => texto
-            try:
-                first_page = pdf.pages[0]
-                is_text = len(first_page.chars) > 0
-            except Exception:
-                is_text = False
-            info["pages"] = num_pages
-            info["is_pdf_text"] = is_text
-    except ImportError:
-        if verbose:
-            print("[WARN] pdfplumber não instalado – pulando detecção de texto.")
-    except Exception as e:
-        if verbose:
-            print(f"[WARN] Falha ao abrir PDF com pdfplumber: {e}")
 
-    # Metadata & revisions via pikepdf
+def _content_bytes(obj) -> bytes:
+    """Decoded content of a page (all /Contents streams) or form XObject."""
+    if isinstance(obj, _pikepdf.Stream):
+        return obj.read_bytes()
+    contents = obj.get("/Contents")
+    if contents is None:
+        return b""
+    if isinstance(contents, _pikepdf.Array):
+        return b"\n".join(c.read_bytes() for c in contents)
+    return contents.read_bytes()
+
+
+def _resources(obj, inherited=None):
+    """/Resources of a page (including those inherited from /Pages) or form.
+
+    A form XObject without its own /Resources uses the ones of whatever
+    draws it (``inherited``).
+    """
+    if obj.get("/Type") == "/Page":
+        return _pikepdf.Page(obj).resources
+    return obj.get("/Resources", inherited if inherited is not None else {})
+
+
+def _has_text_ops(obj, _seen: set | None = None, _inherited=None) -> bool:
+    """True if the page (or form XObject) content shows any text.
+
+    Fast path: a regex over the raw content bytes. Only when it finds no
+    text operator but the content draws XObjects (``Do``), the content holds
+    inline images (``BI``, whose binary data would fool the regex), or the
+    stream cannot be decoded, does ``parse_content_stream`` tokenise it so
+    that form XObjects can be followed.
+    """
     try:
-        import pikepdf  # type: ignore
-
-        with pikepdf.open(str(path)) as pdf:
-            info["metadata"] = {
-                k[1:]: str(v) for k, v in pdf.docinfo.items()
-            }
-            info["revisions"] = pdf.pdf_version
-            info["has_xref_streams"] = pdf.has_xref_streams
-    except ImportError:
-        if verbose:
-            print("[WARN] pikepdf não instalado – metadados não extraídos.")
-    except Exception as e:
+        raw = _content_bytes(obj)
+    except Exception:  # filtro não suportado etc.: vai pelo parser
+        raw = None
+    if raw is not None and _BI_OP_RE.search(raw):
+        raw = None
+    if raw is not None:
+        if _TEXT_OP_RE.search(raw):
+            return True
+        if not _DO_OP_RE.search(raw):
+            return False
+
+    seen = _seen if _seen is not None else set()
+    forms = []
+    for operands, op in _pikepdf.parse_content_stream(obj):
+        name = str(op)
+        if name in _TEXT_OPS:
+            return True
+        if name == "Do" and operands:
+            forms.append(operands[0])
+    if not forms:
+        return False
+    resources = _resources(obj, _inherited)
+    xobjects = resources.get("/XObject", {})
+    for ref in forms:
+        xo = xobjects.get(ref)
+        if xo is None or xo.get("/Subtype") != "/Form" or xo.objgen in seen:
+            continue
+        seen.add(xo.objgen)
+        if _has_text_ops(xo, seen, resources):
+            return True
+    return False
+
+
+def _render_pages(path: Path, out_dir: Path, fmt: str = "jpeg", verbose=False) -> list[str]:
+    """Render the PDF at 300 dpi with a single ``convert_from_path`` call.
+
+    pdf2image splits the pages across ``thread_count`` Poppler processes and
+    writes them straight to disk (``paths_only``) as
+    ``{stem}_page{thread:04d}-{page}.{jpg,png}``, in page order. Each call
+    gets a fresh ``{stem}_*`` subdirectory of ``out_dir``: pdf2image collects
+    the results by file-name prefix, so pages left over from an earlier
+    render of the same stem would be returned too. JPEG is the default, as
+    its encoder is far cheaper than PNG's DEFLATE; lossless PNG goes through
+    pdftocairo.
+    """
+    render_dir = Path(tempfile.mkdtemp(prefix=f"{path.stem}_", dir=out_dir))
+    if verbose:
+        print(f"[INFO] Renderizando páginas em {render_dir}…")
+    img_paths = _pdf2image.convert_from_path(
+        str(path),
+        dpi=300,
+        thread_count=os.cpu_count() or 1,
+        output_folder=str(render_dir),
+        output_file=f"{path.stem}_page",
+        fmt=fmt,
+        jpegopt={"quality": 85, "progressive": True} if fmt == "jpeg" else None,
+        use_pdftocairo=fmt == "png",
+        paths_only=True,
+    )
+    if verbose:
+        print(f"[INFO] {len(img_paths)} páginas renderizadas")
+    return img_paths
+
+
+def _preprocess_pdf(
+    path: Path, out_dir: Optional[Path] = None, verbose=False, fmt: str = "jpeg", metadata: bool = True
+) -> dict:
+    info: dict[str, Any] = {}
+
+    # Páginas, texto, metadados & revisões via pikepdf
+    if _pikepdf is None:
         if verbose:
-            print(f"[WARN] Falha ao ler metadados com pikepdf: {e}")
+            print("[WARN] pikepdf não instalado – páginas e metadados não extraídos.")
+    else:
+        try:
+            with _pikepdf.open(str(path)) as pdf:
+                info["pages"] = len(pdf.pages)
+                # A heurística: se a primeira página desenha texto => PDF com texto
+                try:
+                    info["is_pdf_text"] = _has_text_ops(pdf.pages[0].obj)
+                except Exception:
+                    info["is_pdf_text"] = False
+                if metadata:
+                    info["metadata"] = {
+                        k[1:]: str(v) for k, v in pdf.docinfo.items()
+                    }
+                info["revisions"] = pdf.pdf_version
+                info["has_xref_streams"] = pdf.has_xref_streams
+        except Exception as e:
+            if verbose:
+                print(f"[WARN] Falha ao ler PDF com pikepdf: {e}")
 
     # Render pages if needed
     if out_dir and info.get("is_pdf_text") is False:
+        if _pdf2image is None:
+            if verbose:
+                print("[INFO] pdf2image não instalado – pulando renderização.")
+            return info
         try:
-            from pdf2image import convert_from_path  # type: ignore
-            from tqdm import tqdm  # type: ignore
-
             out_dir.mkdir(parents=True, exist_ok=True)
-            images = convert_from_path(str(path), dpi=300)
-            img_paths: list[str] = []
-            for idx, img in enumerate(tqdm(images, desc="Renderizando páginas")):
-                img_path = out_dir / f"{path.stem}_page_{idx+1}.png"
-                img.save(img_path, "PNG")
-                img_paths.append(str(img_path))
-            info["rendered_images"] = img_paths
-        except ImportError:
-            if verbose:
-                print("[INFO] pdf2image/Tesseract não instalados – pulando renderização.")
+            info["rendered_images"] = _render_pages(path, out_dir, fmt, verbose)
         except Exception as e:
             if verbose:
                 print(f"[WARN] Falha ao renderizar páginas: {e}")
@@ -151,10 +345,12 @@ def _preprocess_pdf(path: Path, out_dir: Optional[Path] = None, verbose=False) -
 
 def _preprocess_docx(path: Path, verbose=False) -> dict:
     info: dict[str, Any] = {}
+    if _docx is None:
+        if verbose:
+            print("[WARN] python-docx não instalado – metadados não extraídos.")
+        return info
     try:
-        import docx  # python-docx, type: ignore
-
-        doc = docx.Document(str(path))
+        doc = _docx.Document(str(path))
         core = doc.core_properties
         info["metadata"] = {
             "author": core.author,
@@ -164,9 +360,6 @@ def _preprocess_docx(path: Path, verbose=False) -> dict:
             "title": core.title,
         }
         info["paragraphs"] = len(doc.paragraphs)
-    except ImportError:
-        if verbose:
-            print("[WARN] python-docx não instalado – metadados não extraídos.")
     except Exception as e:
         if verbose:
             print(f"[WARN] Falha ao processar DOCX: {e}")
@@ -174,40 +367,106 @@ def _preprocess_docx(path: Path, verbose=False) -> dict:
     return info
 
 
+# ---------------------------------------------------------------------------
+# Cache
+# ---------------------------------------------------------------------------
+
+def _cache_entry(sha256: str) -> Path:
+    return CACHE_DIR / f"{sha256}.v{_CACHE_VERSION}.json"
+
+
+def _cache_load(sha256: str, path: Path) -> PreprocessInfo | None:
+    if not _private_cache_dir(CACHE_DIR):
+        return None
+    try:
+        info = PreprocessInfo(**json.loads(_cache_entry(sha256).read_text(encoding="utf-8")))
+    except (OSError, ValueError, TypeError):  # ausente ou ilegível: recalcula
+        return None
+    info.path = str(path)  # a entrada pode ter sido gravada sob outro nome
+    return info
+
+
+def _cache_store(info: PreprocessInfo) -> None:
+    entry = _cache_entry(info.sha256)
+    if not _private_cache_dir(CACHE_DIR):
+        return
+    try:
+        tmp = entry.with_name(f"{entry.stem}.{os.getpid()}.tmp")
+        tmp.write_text(json.dumps(asdict(info), ensure_ascii=False), encoding="utf-8")
+        tmp.replace(entry)  # atômico: leitores nunca veem JSON pela metade
+    except OSError:
+        pass
+
+
 # ---------------------------------------------------------------------------
 # Public API
 # ---------------------------------------------------------------------------
 
-def preprocess(filepath: str | Path, out_dir: str | Path | None = None, verbose=False) -> PreprocessInfo:
+def preprocess(
+    filepath: str | Path,
+    out_dir: str | Path | None = None,
+    verbose=False,
+    fmt: str = "jpeg",
+    cache: bool = True,
+    *,
+    hash_only: bool = False,
+    metadata: bool = True,
+) -> PreprocessInfo:
+    """Pré‑processa o documento.
+
+    Sem `out_dir` (nada a renderizar) e com `cache`, o resultado é lido de /
+    gravado em CACHE_DIR, chaveado pelo SHA‑256 do conteúdo.
+
+    `hash_only` devolve só hashes e tipo, sem abrir o PDF/DOCX; `metadata=False`
+    pula a extração de metadados. Nesses modos o cache não é lido nem gravado.
+    """
     path = Path(filepath).expanduser().resolve()
     if not path.exists():
         raise FileNotFoundError(path)
 
-    sha256, sha512 = _hash_file(path)
+    sha256, sha512, blake3 = _hash_file(path)
 
-    mime = _detect_mime(path) or ""
-    ext = path.suffix.lower()
+    # só resultados completos entram ou saem do cache
+    use_cache = cache and not out_dir and not hash_only and metadata
+    if use_cache:
+        cached = _cache_load(sha256, path)
+        if cached is not None:
+            # digests do cache podem ser de outra configuração (HASH_ALGO, blake3
+            # instalado ou não): valem sempre os recém-calculados
+            cached.sha512, cached.blake3 = sha512, blake3
+            if verbose:
+                print(f"[INFO] Pré‑processamento de {path.name} lido do cache")
+            return cached
 
-    if mime == "application/pdf" or ext == ".pdf":
+    # extensão primeiro; mimetypes só para nomes sem extensão conhecida
+    ext = path.suffix.lower()
+    if ext == ".pdf":
         file_type = "PDF"
-        extra = _preprocess_pdf(path, Path(out_dir) if out_dir else None, verbose)
-    elif ext in {".docx", ".doc"} or "word" in mime:
+    elif ext in {".docx", ".doc"}:
         file_type = "DOCX"
-        extra = _preprocess_docx(path, verbose)
     else:
-        file_type = "UNKNOWN"
-        extra = {}
+        mime = _detect_mime(path) or ""
+        file_type = "PDF" if mime == "application/pdf" else "DOCX" if "word" in mime else "UNKNOWN"
+
+    extra: dict[str, Any] = {}
+    if not hash_only and file_type == "PDF":
+        extra = _preprocess_pdf(path, Path(out_dir) if out_dir else None, verbose, fmt, metadata)
+    elif not hash_only and file_type == "DOCX" and metadata:
+        extra = _preprocess_docx(path, verbose)
 
     info = PreprocessInfo(
         path=str(path),
         file_type=file_type,
         sha256=sha256,
         sha512=sha512,
+        blake3=blake3,
         pages=extra.get("pages"),
         is_pdf_text=extra.get("is_pdf_text"),
         metadata=extra.get("metadata", {}),
         rendered_images=extra.get("rendered_images", []),
     )
+    if use_cache:
+        _cache_store(info)
     return info
 
 
@@ -221,10 +480,12 @@ def _cli():
     parser = argparse.ArgumentParser(description="Pré-processador de documentos PDF/DOCX para forense.")
     parser.add_argument("arquivo", help="Caminho do documento (PDF ou DOCX)")
     parser.add_argument("--out", help="Diretório de saída para imagens renderizadas (PDF raster)")
+    parser.add_argument("--fmt", choices=["jpeg", "png"], default="jpeg", help="Formato das páginas renderizadas (padrão: jpeg)")
+    parser.add_argument("--no-cache", action="store_true", help="Ignorar o cache de resultados")
     parser.add_argument("--verbose", action="store_true")
     args = parser.parse_args()
 
-    info = preprocess(args.arquivo, args.out, args.verbose)
+    info = preprocess(args.arquivo, args.out, args.verbose, args.fmt, cache=not args.no_cache)
     print(info.to_json())
 
 
@@ -0,0 +1,58 @@
+"""Regressões do document_preprocessor.
+
+    python -m unittest discover -s tests
+"""
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import document_preprocessor as dp  # noqa: E402
+
+try:
+    import pikepdf
+except ImportError:  # pragma: no cover
+    pikepdf = None
+
+# bytes "comprimidos" que casam com o regex de operador de texto: ") Tj", "] TJ", "> '"
+_FAKE_DCT = b"\xff\xd8\xff\xe0\x00\x10JFIF) Tj \x9a] TJ\n> ' \xff\xd9"
+
+
+def _write_pdf(path: Path, content: bytes) -> Path:
+    pdf = pikepdf.new()
+    pdf.add_blank_page(page_size=(500, 600))
+    pdf.pages[0].obj.Contents = pdf.make_stream(content)
+    pdf.save(path)
+    return path
+
+
+@unittest.skipIf(pikepdf is None, "pikepdf ausente")
+class HasTextOpsTest(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.dir = Path(tmp.name)
+
+    def test_inline_image_scan_is_not_text(self):
+        content = b"q 500 0 0 600 0 0 cm BI /W 1 /H 1 /CS /G /BPC 8 /F /DCT ID " + _FAKE_DCT + b"\nEI Q"
+        self.assertTrue(dp._TEXT_OP_RE.search(content))
+        path = _write_pdf(self.dir / "inline_scan.pdf", content)
+        self.assertFalse(dp.preprocess(path, cache=False).is_pdf_text)
+
+    def test_inline_image_with_text_is_text(self):
+        content = (
+            b"q 1 0 0 1 0 0 cm BI /W 1 /H 1 /CS /G /BPC 8 /F /DCT ID " + _FAKE_DCT + b"\nEI Q\n"
+            b"BT /F1 12 Tf 10 10 Td (texto) Tj ET"
+        )
+        path = _write_pdf(self.dir / "inline_text.pdf", content)
+        self.assertTrue(dp.preprocess(path, cache=False).is_pdf_text)
+
+    def test_plain_text_page(self):
+        path = _write_pdf(self.dir / "text.pdf", b"BT /F1 12 Tf 10 10 Td (texto) Tj ET")
+        self.assertTrue(dp.preprocess(path, cache=False).is_pdf_text)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -3,7 +3,7 @@
 Primeira camada do fluxo: calcula hashes e valida assinaturas digitais
 (PDF PAdES/LTV, DOCX XML Digital Signature).
 
-• Depende de: pikepdf, pyhanko, cryptography, python-docx.
+• Depende de: pikepdf, pyhanko, cryptography, python-docx; blake3 (opcional).
 • Integra‑se ao document_preprocessor.preprocess()
 
 CLI:
@@ -14,6 +14,7 @@ from __future__ import annotations
 import argparse
 import hashlib
 import json
+import re
 import sys
 from dataclasses import asdict, dataclass
 from pathlib import Path
@@ -23,10 +24,27 @@ from typing import List, Optional
 # Import do pré‑processador (opcional)
 # ---------------------------------------------------------------------------
 try:
-    from document_preprocessor import preprocess  # type: ignore
+    from document_preprocessor import (  # type: ignore
+        PreprocessInfo,
+        _digest_algos,
+        _file_digest,
+        _json_dumps,
+        preprocess,
+    )
 except ImportError:
+    PreprocessInfo = None  # type: ignore
     preprocess = None  # type: ignore
 
+    def _digest_algos() -> list[str]:  # type: ignore
+        return ["sha256", "sha512"]
+
+    def _file_digest(path: Path, algo: str) -> str:  # type: ignore
+        with path.open("rb", buffering=0) as f:
+            return hashlib.file_digest(f, algo).hexdigest()
+
+    def _json_dumps(obj) -> str:  # type: ignore
+        return json.dumps(asdict(obj), ensure_ascii=False, indent=2)
+
 # ---------------------------------------------------------------------------
 # PDF signature validation (pyHanko) – carregamento lazy
 # ---------------------------------------------------------------------------
@@ -39,6 +57,19 @@ try:
 except ImportError:
     _PYHANKO_OK = False
 
+_VC = None
+
+
+def _get_vc():
+    """ValidationContext único por processo, criado na primeira validação.
+
+    O trust store do sistema é carregado uma vez e reaproveitado nas seguintes.
+    """
+    global _VC
+    if _VC is None:
+        _VC = ValidationContext()
+    return _VC
+
 # ---------------------------------------------------------------------------
 # DOCX signature validation (basic – XMLDSig)
 # ---------------------------------------------------------------------------
@@ -66,19 +97,25 @@ class SignatureSummary:
 class VerificationReport:
     file_path: str
     sha256: str
-    sha512: str
+    sha512: Optional[str]
     signatures: List[SignatureSummary]
+    blake3: Optional[str] = None
 
     def to_json(self) -> str:
-        return json.dumps(asdict(self), ensure_ascii=False, indent=2)
+        return _json_dumps(self)
 
 
 # ---------------------------------------------------------------------------
 # Utilidades
 # ---------------------------------------------------------------------------
 
-def _calc_hashes(b: bytes) -> tuple[str, str]:
-    return hashlib.sha256(b).hexdigest(), hashlib.sha512(b).hexdigest()
+def _calc_hashes(path: Path) -> tuple[str, Optional[str], Optional[str]]:
+    """(sha256, sha512, blake3) lendo o arquivo em blocos, sem carregá‑lo na RAM.
+
+    Além do SHA‑256, só o digest escolhido em HASH_ALGO é calculado.
+    """
+    digests = {algo: _file_digest(path, algo) for algo in _digest_algos()}
+    return digests["sha256"], digests.get("sha512"), digests.get("blake3")
 
 
 # ---------------------------------------------------------------------------
@@ -96,13 +133,20 @@ def _verify_pdf(path: Path) -> List[SignatureSummary]:
         if not reader.embedded_signatures:
             return []  # sem assinatura
 
-        vc = ValidationContext()  # usa trust store do sistema
+        vc = _get_vc()  # usa trust store do sistema
+        # subject.native decodifica o ASN.1 a cada acesso: um por certificado.
+        # Chave = DER do certificado (id() pode ser reaproveitado entre objetos).
+        subj_cache: dict[bytes, dict] = {}
         for sig in reader.embedded_signatures:
             try:
                 status = validate_pdf_signature(sig, vc)
                 signer_cn = None
-                if sig.signer_cert is not None:
-                    subj = sig.signer_cert.subject.native  # type: ignore
+                cert = sig.signer_cert
+                if cert is not None:
+                    key = cert.dump()
+                    subj = subj_cache.get(key)
+                    if subj is None:
+                        subj = subj_cache[key] = cert.subject.native  # type: ignore
                     signer_cn = subj.get("common_name") or subj.get("organization_name")
                 status_str = "VALID" if status.trusted and status.intact else "INVALID"  # type: ignore
                 results.append(
@@ -134,6 +178,8 @@ def _verify_pdf(path: Path) -> List[SignatureSummary]:
 # DOCX (simplificado)
 # ---------------------------------------------------------------------------
 
+_SIG_RE = re.compile(r"^_xmlsignatures/.*\.sig\Z")
+
 def _verify_docx(path: Path) -> List[SignatureSummary]:
     if not _CRYPTO_OK:
         print("[WARNING] cryptography não disponível; pulando validação DOCX.")
@@ -142,11 +188,11 @@ def _verify_docx(path: Path) -> List[SignatureSummary]:
     sigs: List[SignatureSummary] = []
     try:
         with zipfile.ZipFile(path) as zf:
-            sig_rel_paths = [p for p in zf.namelist() if p.startswith("_xmlsignatures/") and p.endswith(".sig")]
-            if not sig_rel_paths:
-                return []
-            for rel in sig_rel_paths:
-                sigs.append(SignatureSummary(None, None, "PRESENT", f"Assinatura encontrada em {rel} (validação simplificada)"))
+            # percorre o diretório central já carregado (infolist), sem montar namelist()
+            for zi in zf.infolist():
+                rel = zi.filename
+                if _SIG_RE.match(rel):
+                    sigs.append(SignatureSummary(None, None, "PRESENT", f"Assinatura encontrada em {rel} (validação simplificada)"))
     except Exception as exc:
         sigs.append(SignatureSummary(None, None, "ERROR", f"Erro: {exc}"))
     return sigs
@@ -156,19 +202,28 @@ def _verify_docx(path: Path) -> List[SignatureSummary]:
 # Verificação principal
 # ---------------------------------------------------------------------------
 
-def verify(file_path: str | Path) -> VerificationReport:
+def verify(file_path: str | Path, preprocess_info: PreprocessInfo | None = None) -> VerificationReport:
+    """Calcula hashes e valida assinaturas.
+
+    Quem já tem o `PreprocessInfo` do arquivo (p.ex. o pipeline) o repassa
+    em `preprocess_info` e o pré‑processamento não é refeito. Os digests
+    vêm do `PreprocessInfo`; o arquivo só é relido se ele não existir.
+    """
     path = Path(file_path).expanduser().resolve()
     if not path.is_file():
         raise FileNotFoundError(path)
 
-    sha256, sha512 = _calc_hashes(path.read_bytes())
-
-    if preprocess is not None:
+    if preprocess_info is None and preprocess is not None:
         try:
-            preprocess(path)
+            preprocess_info = preprocess(path, hash_only=True)
         except Exception as exc:
             print(f"[WARNING] Preprocess falhou: {exc}")
 
+    if preprocess_info is not None and Path(preprocess_info.path) == path:
+        sha256, sha512, b3 = preprocess_info.sha256, preprocess_info.sha512, preprocess_info.blake3
+    else:
+        sha256, sha512, b3 = _calc_hashes(path)
+
     suffix = path.suffix.lower()
     if suffix == ".pdf":
         signatures = _verify_pdf(path)
@@ -177,7 +232,7 @@ def verify(file_path: str | Path) -> VerificationReport:
     else:
         signatures = []
 
-    return VerificationReport(str(path), sha256, sha512, signatures)
+    return VerificationReport(str(path), sha256, sha512, signatures, blake3=b3)
 
 
 # ---------------------------------------------------------------------------
@@ -196,7 +251,10 @@ def _cli() -> None:  # pragma: no cover
     print("\n=== Relatório de Verificação ===")
     print(f"Arquivo : {report.file_path}")
     print(f"SHA‑256 : {report.sha256}")
-    print(f"SHA‑512 : {report.sha512}")
+    if report.sha512:
+        print(f"SHA‑512 : {report.sha512}")
+    if report.blake3:
+        print(f"BLAKE3  : {report.blake3}")
     if not report.signatures:
         print("Nenhuma assinatura detectada.")
     else:
@@ -11,7 +11,7 @@ Camadas:
  4. Texto                         (analise_texto)
 
 Uso CLI:
-    python verificador_documental.py <arquivo> [-v] [-o out.json]
+    python verificador_documental.py <arquivo> [-v] [-o out.json] [--cache]
          [--poppler-path "C:\Poppler\bin"]
 
 Saída JSON:
@@ -27,13 +27,13 @@ Saída JSON:
 from __future__ import annotations
 
 import argparse
-import json
 import sys
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import asdict
 from pathlib import Path
 from typing import Any, Dict
 
-from document_preprocessor import preprocess
+from document_preprocessor import _json_dumps, preprocess
 import verifica_hash_assinatura as vhash
 import analise_estrutura as estr
 import analise_visual as vis
@@ -41,22 +41,37 @@ import analise_texto as txt
 
 # -----------------------------------------------------------
 
-def run_pipeline(path: str, *, poppler_path: str | None = None, verbose: bool = False) -> Dict[str, Any]:
-    # -------- camada 0: preprocess --------
-    pinfo = preprocess(path)
-    pages = getattr(pinfo, "num_pages", "?")
-    if verbose:
-        print(f"[0] Preprocess ok – {pinfo.file_type} {pages}p")
-
-    # -------- camada 1: hash & assinatura --------
-    hrep = vhash.verify(path)
-    hdict = asdict(hrep)
-    sig_status = hdict.get("signatures", [{}])[0].get("status")
-    if verbose:
-        print("[1] Assinatura:", sig_status)
-
-    # -------- camada 2: estrutura --------
-    erep = estr.analyze_structure(path, verbose=verbose)
+def run_pipeline(
+    path: str, *, poppler_path: str | None = None, verbose: bool = False, cache: bool = False
+) -> Dict[str, Any]:
+    """Executa as camadas 0–4 sobre o arquivo.
+
+    `cache` (opt-in) reaproveita resultados de preprocess/estrutura gravados
+    no cache do usuário por execuções anteriores.
+    """
+    # Camadas 0–2 são independentes entre si (a 1 só reaproveita o resultado
+    # da 0) e passam a maior parte do tempo em I/O e código nativo
+    # (hashlib, qpdf), que liberam o GIL: rodam em paralelo em threads.
+    with ThreadPoolExecutor(max_workers=3) as pool:
+        f_pre = pool.submit(preprocess, path, cache=cache)
+        f_estr = pool.submit(estr.analyze_structure, path, verbose=verbose, cache=cache)
+        f_hash = pool.submit(lambda: vhash.verify(path, preprocess_info=f_pre.result()))
+
+        # -------- camada 0: preprocess --------
+        pinfo = f_pre.result()
+        pages = getattr(pinfo, "num_pages", "?")
+        if verbose:
+            print(f"[0] Preprocess ok – {pinfo.file_type} {pages}p")
+
+        # -------- camada 1: hash & assinatura --------
+        hrep = f_hash.result()
+        hdict = asdict(hrep)
+        sig_status = hdict.get("signatures", [{}])[0].get("status")
+        if verbose:
+            print("[1] Assinatura:", sig_status)
+
+        # -------- camada 2: estrutura --------
+        erep = f_estr.result()
     edict = asdict(erep)
     if verbose and erep.pdf_findings:
         print("[2] Estrutura PDF – incr.updates:", erep.pdf_findings.incremental_updates)
@@ -103,20 +118,21 @@ def _cli() -> None:  # pragma: no cover
     parser.add_argument("--poppler-path", help="Caminho do pdftoppm (Poppler) se não estiver no PATH", default=None)
     parser.add_argument("--verbose", "-v", action="store_true", help="Logs detalhados")
     parser.add_argument("--out", "-o", help="Arquivo JSON de saída")
+    parser.add_argument("--cache", action="store_true", help="Reaproveitar resultados em cache (preprocess/estrutura)")
     args = parser.parse_args()
 
     try:
-        rep = run_pipeline(args.arquivo, poppler_path=args.poppler_path, verbose=args.verbose)
+        rep = run_pipeline(args.arquivo, poppler_path=args.poppler_path, verbose=args.verbose, cache=args.cache)
     except Exception as exc:
         print(f"[FATAL] Falha no pipeline: {exc}", file=sys.stderr)
         sys.exit(1)
 
     if args.out:
-        Path(args.out).write_text(json.dumps(rep, ensure_ascii=False, indent=2))
+        Path(args.out).write_text(_json_dumps(rep))
         if args.verbose:
             print(f"Relatório salvo em {args.out}")
     else:
-        print(json.dumps(rep, ensure_ascii=False, indent=2))
+        print(_json_dumps(rep))
 
 if __name__ == "__main__":
     _cli()